@@ -3,19 +3,26 @@
 API REST para el capturador de video desde múltiples cámaras.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 # Importar módulos propios
 from config import (
-    CAMARAS, 
-    DIRECTORIO_VIDEOS, 
+    CAMARAS,
+    BLOQUEO_CAMARAS,
+    DIRECTORIO_VIDEOS,
     FORMATO_NOMBRE,
     obtener_camaras_habilitadas,
     obtener_camara_por_id,
@@ -27,11 +34,99 @@ from config import (
 )
 from capturador import capturar_video, capturar_todas_las_camaras
 
+# Serialización JSON: orjson codifica en C directo a bytes y es varias veces
+# más rápido que json, tanto para reportes como para respuestas de la API;
+# si no está instalado se usa el stdlib
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+
+    _clase_respuesta = ORJSONResponse
+
+    def _serializar_reporte(reporte):
+        """Serializa el reporte a bytes JSON indentado."""
+        return orjson.dumps(reporte, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _clase_respuesta = JSONResponse
+
+    def _serializar_reporte(reporte):
+        """Serializa el reporte a bytes JSON indentado."""
+        return json.dumps(reporte, indent=2, ensure_ascii=False).encode("utf-8")
+
+# Límites para el registro de tareas: el dict de tareas es estado global
+# de un servidor de larga vida y sin tope crecería sin límite
+_MAX_TAREAS = 256
+_TTL_TAREAS = 3600  # segundos antes de que una tarea terminada expire
+
+# Variable para mantener estado de tareas en progreso (más reciente al final)
+tareas_activas = OrderedDict()
+_tareas_actualizadas = {}
+
+# Tareas en estos estados siguen corriendo: no se expiran ni se desalojan,
+# para que /estado/{task_id} no devuelva 404 con la captura aún en marcha
+_ESTADOS_EN_CURSO = ("pendiente", "en_progreso")
+
+def _registrar_tarea(task_id, valor):
+    """
+    Registra o actualiza el estado de una tarea, acotando el registro.
+
+    Mantiene el dict ordenado por último acceso y descarta las tareas
+    terminadas más antiguas cuando se supera _MAX_TAREAS; las tareas aún
+    en curso nunca se desalojan.
+    """
+    tareas_activas[task_id] = valor
+    tareas_activas.move_to_end(task_id)
+    _tareas_actualizadas[task_id] = time.time()
+    if len(tareas_activas) > _MAX_TAREAS:
+        for tid in list(tareas_activas):
+            if len(tareas_activas) <= _MAX_TAREAS:
+                break
+            if tareas_activas[tid].get("estado") in _ESTADOS_EN_CURSO:
+                continue
+            del tareas_activas[tid]
+            _tareas_actualizadas.pop(tid, None)
+
+async def _limpiar_tareas_vencidas():
+    """Tarea de fondo que elimina periódicamente las tareas terminadas expiradas."""
+    while True:
+        await asyncio.sleep(300)
+        limite = time.time() - _TTL_TAREAS
+        vencidas = [
+            tid for tid, ts in _tareas_actualizadas.items()
+            if ts < limite
+            and tareas_activas.get(tid, {}).get("estado") not in _ESTADOS_EN_CURSO
+        ]
+        for tid in vencidas:
+            tareas_activas.pop(tid, None)
+            _tareas_actualizadas.pop(tid, None)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranca y detiene las tareas de fondo propias del servidor."""
+    # Pool explícito para el trabajo bloqueante delegado desde el event loop;
+    # el tamaño se puede ajustar sin tocar código vía THREAD_POOL_SIZE
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=int(os.getenv("THREAD_POOL_SIZE", "32")))
+    )
+    app.state.background_tasks = set()
+    limpiador = asyncio.create_task(_limpiar_tareas_vencidas())
+    app.state.background_tasks.add(limpiador)
+    limpiador.add_done_callback(app.state.background_tasks.discard)
+    try:
+        yield
+    finally:
+        for tarea in list(app.state.background_tasks):
+            tarea.cancel()
+        await asyncio.gather(*app.state.background_tasks, return_exceptions=True)
+
 # Crear la aplicación FastAPI
 app = FastAPI(
     title="API de Captura de Video",
     description="API para gestionar la captura de video desde múltiples cámaras",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=_clase_respuesta
 )
 
 # Configurar CORS para permitir acceso desde el frontend
@@ -44,21 +139,6 @@ app.add_middleware(
 )
 
 # Modelos de datos para la API
-class Camara(BaseModel):
-    id: str
-    nombre: str
-    url: str
-    duracion: Optional[int] = 30
-    fps: Optional[int] = 30
-    habilitada: Optional[bool] = True
-
-class ResultadoCaptura(BaseModel):
-    id: str
-    nombre: str
-    exito: bool
-    archivo: str
-    mensaje: str
-
 class ActualizarCamara(BaseModel):
     url: Optional[str] = None
     nombre: Optional[str] = None
@@ -66,9 +146,6 @@ class ActualizarCamara(BaseModel):
     fps: Optional[int] = None
     habilitada: Optional[bool] = None
 
-# Variable para mantener estado de tareas en progreso
-tareas_activas = {}
-
 # Funciones auxiliares
 def guardar_resultados(resultados):
     """Guarda los resultados de la captura en un archivo JSON."""
@@ -78,60 +155,70 @@ def guardar_resultados(resultados):
         os.makedirs(directorio_reportes)
     
     # Generar nombre de archivo con timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     archivo_reporte = os.path.join(directorio_reportes, f"captura_{timestamp}.json")
     
     # Obtener información del formato actual
     formato = obtener_extension().upper()
     codec = obtener_codec()
     
+    # Contar éxitos en una sola pasada; las fallas se derivan del total
+    total_camaras = len(resultados)
+    exitosas = sum(r["exito"] for r in resultados)
+
     # Crear un diccionario con información del reporte
     reporte = {
         "fecha": datetime.now().isoformat(),
-        "total_camaras": len(resultados),
-        "exitosas": sum(1 for r in resultados if r["exito"]),
-        "fallidas": sum(1 for r in resultados if not r["exito"]),
+        "total_camaras": total_camaras,
+        "exitosas": exitosas,
+        "fallidas": total_camaras - exitosas,
         "formato_video": f"{formato} ({codec})",
         "resultados": resultados
     }
     
-    # Guardar como JSON
-    with open(archivo_reporte, 'w', encoding='utf-8') as f:
-        json.dump(reporte, f, indent=2, ensure_ascii=False)
-    
+    # Guardar como JSON: se serializa a bytes de una vez y se escribe con
+    # una sola llamada en lugar de muchas escrituras pequeñas
+    with open(archivo_reporte, 'wb') as f:
+        f.write(_serializar_reporte(reporte))
+
     return archivo_reporte, reporte
 
-def background_capture_all(task_id: str, max_hilos: int = 4):
-    """Función para ejecutar captura en segundo plano"""
+async def _bg_capture_all(task_id: str, max_hilos: int = 4):
+    """Tarea asyncio que ejecuta la captura de todas las cámaras en segundo plano"""
     camaras_habilitadas = obtener_camaras_habilitadas()
     if not camaras_habilitadas:
-        tareas_activas[task_id] = {"estado": "error", "mensaje": "No hay cámaras habilitadas para capturar."}
+        _registrar_tarea(task_id, {"estado": "error", "mensaje": "No hay cámaras habilitadas para capturar."})
         return
-    
+
     try:
         # Cambiar estado a "en progreso"
-        tareas_activas[task_id] = {"estado": "en_progreso", "progreso": 0}
-        
-        # Realizar captura
-        resultados = capturar_todas_las_camaras(
-            camaras_habilitadas, 
-            DIRECTORIO_VIDEOS, 
+        _registrar_tarea(task_id, {"estado": "en_progreso", "progreso": 0})
+
+        # Realizar captura en el threadpool; la tarea queda cancelable desde
+        # el lifespan sin bloquear el event loop mientras dura la captura
+        resultados = await run_in_threadpool(
+            capturar_todas_las_camaras,
+            camaras_habilitadas,
+            DIRECTORIO_VIDEOS,
             FORMATO_NOMBRE,
             max_hilos=max_hilos
         )
-        
+
         # Guardar resultados
-        archivo_reporte, reporte = guardar_resultados(resultados)
-        
+        archivo_reporte, reporte = await run_in_threadpool(guardar_resultados, resultados)
+
         # Actualizar estado a "completado"
-        tareas_activas[task_id] = {
-            "estado": "completado", 
+        _registrar_tarea(task_id, {
+            "estado": "completado",
             "reporte": reporte,
             "archivo_reporte": archivo_reporte
-        }
+        })
+    except asyncio.CancelledError:
+        _registrar_tarea(task_id, {"estado": "error", "mensaje": "Captura cancelada por apagado del servidor"})
+        raise
     except Exception as e:
         # Registrar error
-        tareas_activas[task_id] = {"estado": "error", "mensaje": str(e)}
+        _registrar_tarea(task_id, {"estado": "error", "mensaje": str(e)})
 
 # Rutas de la API
 
@@ -151,18 +238,21 @@ async def root():
         ]
     }
 
-@app.get("/camaras", response_model=List[Camara])
+# Los endpoints de solo lectura devuelven la configuración convertida a
+# dict directamente: ya tiene la forma publicada y revalidarla con un
+# response_model costaría un pase de Pydantic por request en rutas de polling
+@app.get("/camaras")
 async def listar_camaras():
     """Obtiene la lista de todas las cámaras configuradas"""
-    return CAMARAS
+    return [camara.a_dict() for camara in CAMARAS]
 
-@app.get("/camaras/{id_camara}", response_model=Camara)
+@app.get("/camaras/{id_camara}")
 async def obtener_camara(id_camara: str):
     """Obtiene la información de una cámara específica por su ID"""
     camara = obtener_camara_por_id(id_camara)
     if not camara:
         raise HTTPException(status_code=404, detail=f"Cámara con ID {id_camara} no encontrada")
-    return camara
+    return camara.a_dict()
 
 @app.put("/camaras/{id_camara}")
 async def actualizar_camara(id_camara: str, datos: ActualizarCamara):
@@ -170,37 +260,38 @@ async def actualizar_camara(id_camara: str, datos: ActualizarCamara):
     camara = obtener_camara_por_id(id_camara)
     if not camara:
         raise HTTPException(status_code=404, detail=f"Cámara con ID {id_camara} no encontrada")
-    
-    # Actualizar campos proporcionados
-    for i, c in enumerate(CAMARAS):
-        if c["id"] == id_camara:
-            if datos.url is not None:
-                CAMARAS[i]["url"] = datos.url
-            if datos.nombre is not None:
-                CAMARAS[i]["nombre"] = datos.nombre
-            if datos.duracion is not None:
-                CAMARAS[i]["duracion"] = datos.duracion
-            if datos.fps is not None:
-                CAMARAS[i]["fps"] = datos.fps
-            if datos.habilitada is not None:
-                CAMARAS[i]["habilitada"] = datos.habilitada
-            return CAMARAS[i]
-    
-    # Este código no debería ejecutarse si ya encontramos la cámara arriba
-    raise HTTPException(status_code=500, detail="Error al actualizar la cámara")
+
+    # Actualizar campos proporcionados: camara es el mismo objeto que figura
+    # en CAMARAS, así que se muta directamente bajo el lock
+    with BLOQUEO_CAMARAS:
+        if datos.url is not None:
+            camara.url = datos.url
+        if datos.nombre is not None:
+            camara.nombre = datos.nombre
+        if datos.duracion is not None:
+            camara.duracion = datos.duracion
+        if datos.fps is not None:
+            camara.fps = datos.fps
+        if datos.habilitada is not None:
+            camara.habilitada = datos.habilitada
+    return camara.a_dict()
 
 @app.post("/capturar")
-async def capturar_todas(background_tasks: BackgroundTasks, max_hilos: int = Query(4, ge=1, le=16)):
+async def capturar_todas(max_hilos: int = Query(4, ge=1, le=16)):
     """Inicia la captura de todas las cámaras habilitadas en segundo plano"""
     # Crear un ID único para la tarea
-    task_id = f"task_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    
-    # Iniciar tarea en segundo plano
-    background_tasks.add_task(background_capture_all, task_id, max_hilos)
-    
+    task_id = f"task_{time.strftime('%Y%m%d%H%M%S')}"
+
     # Registrar tarea como pendiente
-    tareas_activas[task_id] = {"estado": "pendiente"}
-    
+    _registrar_tarea(task_id, {"estado": "pendiente"})
+
+    # Lanzar la captura como tarea asyncio rastreada: la referencia en
+    # app.state evita que el recolector la elimine en vuelo y permite
+    # cancelarla en el apagado del servidor
+    tarea = asyncio.create_task(_bg_capture_all(task_id, max_hilos))
+    app.state.background_tasks.add(tarea)
+    tarea.add_done_callback(app.state.background_tasks.discard)
+
     return {"message": "Captura iniciada en segundo plano", "task_id": task_id}
 
 @app.post("/capturar/{id_camara}")
@@ -210,20 +301,22 @@ async def capturar_una_camara(id_camara: str):
     if not camara:
         raise HTTPException(status_code=404, detail=f"Cámara con ID {id_camara} no encontrada")
     
-    if not camara.get("habilitada", True):
+    if not camara.habilitada:
         raise HTTPException(status_code=400, detail=f"La cámara {id_camara} está deshabilitada")
     
-    # Realizar captura (síncrona en este caso para una sola cámara)
-    exito, archivo, mensaje = capturar_video(camara, DIRECTORIO_VIDEOS, FORMATO_NOMBRE)
-    
-    # Obtener tamaño del archivo si fue exitoso
-    tamano_mb = 0
-    if exito and os.path.exists(archivo):
-        tamano_mb = os.path.getsize(archivo) / (1024 * 1024)  # Tamaño en MB
-    
+    # Realizar captura en el threadpool: capturar_video bloquea durante toda
+    # la duración configurada y ejecutarla inline congelaría el event loop
+    exito, archivo, mensaje, bytes_escritos = await run_in_threadpool(
+        capturar_video, camara, DIRECTORIO_VIDEOS, FORMATO_NOMBRE
+    )
+
+    # El capturador ya reporta los bytes escritos: no hace falta volver
+    # a consultar el archivo
+    tamano_mb = bytes_escritos / (1024 * 1024)  # Tamaño en MB
+
     return {
-        "id": camara["id"],
-        "nombre": camara["nombre"],
+        "id": camara.id,
+        "nombre": camara.nombre,
         "exito": exito,
         "archivo": archivo,
         "mensaje": mensaje,
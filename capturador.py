@@ -3,27 +3,123 @@
 Módulo principal para la captura de video desde streams URL.
 """
 
+import asyncio
+import atexit
 import cv2
-import requests
+import http.client
 import numpy as np
+import shutil
+import socket
+import subprocess
 import time
 import os
-from datetime import datetime
+from urllib.parse import urlsplit
 import logging
-from queue import Queue
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue, Empty, Full
 from threading import Thread
 
-# Configurar logging
+# Configurar logging: los handlers reales (archivo y consola) corren en un
+# QueueListener, así la E/S de logging sucede fuera de los hilos de captura
+_formato_logs = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_handler_archivo = logging.FileHandler("captura_video.log")
+_handler_archivo.setFormatter(_formato_logs)
+_handler_consola = logging.StreamHandler()
+_handler_consola.setFormatter(_formato_logs)
+
+_cola_logs = Queue()
+_listener_logs = QueueListener(_cola_logs, _handler_archivo, _handler_consola)
+_listener_logs.start()
+# Drenar la cola al salir: sin esto, los registros aún encolados al
+# terminar el proceso (p. ej. los últimos de una corrida de CLI) se pierden
+atexit.register(_listener_logs.stop)
+
+# Formateador pasacadena en el QueueHandler: sin él, basicConfig instala el
+# formato por defecto y prepare() lo hornea en el mensaje antes de que los
+# handlers del listener apliquen _formato_logs, duplicando nivel y nombre
+_handler_cola = QueueHandler(_cola_logs)
+_handler_cola.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("captura_video.log"),
-        logging.StreamHandler()
-    ]
+    handlers=[_handler_cola]
 )
 logger = logging.getLogger("CapturadorVideo")
 
+# Cache de códigos fourcc por formato: el código es fijo por formato, así
+# que no hace falta regenerarlo con VideoWriter_fourcc en cada captura
+_FOURCC = {}
+
+def _obtener_fourcc(extension, codec):
+    """Retorna el código fourcc para el formato dado, calculándolo una sola vez."""
+    fourcc = _FOURCC.get(extension)
+    if fourcc is None:
+        fourcc = _FOURCC.setdefault(extension, cv2.VideoWriter_fourcc(*codec))
+    return fourcc
+
+# Flags de decodificación por escala: libjpeg escala en el IDCT, así que
+# decodificar a 1/2 de lado cuesta ~1/4 de los píxeles
+_FLAGS_DECODIFICACION = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Decodificador JPEG por hardware (NVJPEG) si el paquete está disponible;
+# solo se usa para decodificación a resolución completa
+try:
+    import pynvjpeg
+    _decodificador_nvjpeg = pynvjpeg.Decoder()
+except ImportError:
+    _decodificador_nvjpeg = None
+
+# Binario de ffmpeg para la copia directa MJPEG (None si no está instalado)
+_FFMPEG = shutil.which("ffmpeg")
+
+# Búsqueda de marcadores JPEG compilada con numba si está disponible: un
+# solo recorrido del buffer encuentra SOI y EOI, en lugar de dos pasadas
+# de bytes.find
+try:
+    import numba
+
+    @numba.njit(cache=True)
+    def _buscar_marcadores_numba(datos, inicio):
+        n = datos.shape[0]
+        soi = -1
+        i = inicio
+        while i < n - 1:
+            if datos[i] == 0xFF:
+                siguiente = datos[i + 1]
+                if soi < 0:
+                    if siguiente == 0xD8:
+                        soi = i
+                elif siguiente == 0xD9:
+                    return soi, i
+            i += 1
+        return soi, -1
+except ImportError:
+    _buscar_marcadores_numba = None
+
+def _buscar_marcadores(buffer, inicio):
+    """
+    Busca el próximo par de marcadores SOI/EOI a partir de inicio.
+
+    Returns:
+        tuple: (posición SOI, posición EOI); -1 donde no se encontró.
+        El EOI solo se busca después del SOI hallado.
+    """
+    if _buscar_marcadores_numba is not None:
+        soi, eoi = _buscar_marcadores_numba(
+            np.frombuffer(buffer, dtype=np.uint8), inicio
+        )
+        return int(soi), int(eoi)
+    a = buffer.find(b'\xff\xd8', inicio)
+    if a == -1:
+        return -1, -1
+    return a, buffer.find(b'\xff\xd9', a + 2)
+
 def configurar_directorios(directorio):
     """Crea los directorios necesarios si no existen."""
     if not os.path.exists(directorio):
@@ -44,33 +140,345 @@ def generar_nombre_archivo(formato, id_camara, directorio, extension=None):
         str: Ruta completa al archivo generado
     """
     from config import obtener_extension
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # time.strftime evita construir un objeto datetime solo para formatear
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
     ext = extension if extension else obtener_extension()
     nombre_archivo = formato.format(id=id_camara, timestamp=timestamp, ext=ext)
     return os.path.join(directorio, nombre_archivo)
 
+# Timeouts del stream: conectar debe fallar rápido para no retener un hilo
+# del pool; la lectura tolera más porque el stream es continuo
+_TIMEOUT_CONEXION = 3
+_TIMEOUT_LECTURA = 10
+
+# Timeout de la preverificación de accesibilidad previa a la captura masiva
+_TIMEOUT_PREVERIFICACION = 0.5
+
+def _camara_accesible(camara):
+    """Comprueba rápidamente si el host:puerto de la cámara acepta conexiones."""
+    partes_url = urlsplit(camara.url)
+    try:
+        with socket.create_connection(
+            (partes_url.hostname, partes_url.port or 80), _TIMEOUT_PREVERIFICACION
+        ):
+            return True
+    except OSError:
+        return False
+
+def _preverificar_camaras(camaras):
+    """
+    Separa las cámaras entre accesibles e inaccesibles con una conexión TCP
+    de prueba por cámara, todas en paralelo.
+
+    Las cámaras inaccesibles se descartan antes de ocupar un hilo de captura,
+    que de otro modo quedaría bloqueado el timeout completo de conexión.
+
+    Returns:
+        tuple: (lista de cámaras accesibles, lista de inaccesibles)
+    """
+    with ThreadPoolExecutor(max_workers=len(camaras)) as executor:
+        accesibles = list(executor.map(_camara_accesible, camaras))
+    vivas = [c for c, ok in zip(camaras, accesibles) if ok]
+    muertas = [c for c, ok in zip(camaras, accesibles) if not ok]
+    return vivas, muertas
+
+def _abrir_stream(url):
+    """
+    Abre una conexión HTTP al stream de la cámara con timeouts separados
+    de conexión y lectura.
+
+    Returns:
+        tuple: (conexión, respuesta). La conexión debe cerrarse al terminar.
+    """
+    partes_url = urlsplit(url)
+    ruta = partes_url.path or "/"
+    if partes_url.query:
+        ruta += "?" + partes_url.query
+    conn = http.client.HTTPConnection(
+        partes_url.hostname, partes_url.port or 80, timeout=_TIMEOUT_CONEXION
+    )
+    conn.request("GET", ruta)
+    # Conectado: relajar el timeout para las lecturas del stream
+    conn.sock.settimeout(_TIMEOUT_LECTURA)
+    return conn, conn.getresponse()
+
+def _extraer_boundary(content_type):
+    """Extrae el boundary multipart del header Content-Type, o None."""
+    for campo in content_type.split(";"):
+        campo = campo.strip()
+        if campo.startswith("boundary="):
+            boundary = campo[len("boundary="):].strip('"')
+            if boundary:
+                return boundary.encode("ascii", "ignore")
+    return None
+
+# Señal de _leer_parte_mjpeg: la parte existe pero no declara
+# Content-Length, así que hay que caer al escaneo de marcadores
+_SIN_CONTENT_LENGTH = object()
+
+def _leer_parte_mjpeg(resp, boundary):
+    """
+    Lee una parte (un frame JPEG) de un stream multipart con Content-Length.
+
+    Avanza hasta la siguiente línea de boundary, parsea las cabeceras de la
+    parte y lee exactamente Content-Length bytes con readinto, sin escanear
+    marcadores JPEG.
+
+    Returns:
+        bytearray con el frame, None si el stream terminó, o
+        _SIN_CONTENT_LENGTH si la parte no declara Content-Length
+    """
+    # Avanzar hasta el boundary de la siguiente parte
+    while True:
+        linea = resp.readline(65536)
+        if not linea:
+            return None
+        if boundary in linea:
+            break
+
+    # Leer cabeceras de la parte hasta la línea vacía
+    content_length = None
+    while True:
+        linea = resp.readline(65536)
+        if not linea or linea in (b'\r\n', b'\n'):
+            break
+        if linea.lower().startswith(b'content-length'):
+            content_length = int(linea.split(b':', 1)[1])
+
+    if content_length is None:
+        return _SIN_CONTENT_LENGTH
+
+    # Leer el frame completo con lecturas exactas sobre un buffer preasignado
+    frame_buf = bytearray(content_length)
+    vista = memoryview(frame_buf)
+    offset = 0
+    while offset < content_length:
+        leidos = resp.readinto(vista[offset:])
+        if not leidos:
+            return None
+        offset += leidos
+    return frame_buf
+
+def _frames_mjpeg(resp, boundary):
+    """
+    Genera los bytes de cada frame JPEG del stream.
+
+    Si el stream es multipart y cada parte declara Content-Length, lee cada
+    frame con lecturas exactas (sin escanear marcadores). En caso contrario
+    recurre al escaneo de marcadores SOI/EOI sobre un buffer acotado.
+    """
+    if boundary is not None:
+        while True:
+            jpg = _leer_parte_mjpeg(resp, boundary)
+            if jpg is None:
+                return
+            if jpg is _SIN_CONTENT_LENGTH:
+                # Muchos servidores MJPEG (p. ej. los video_feed de
+                # Flask/OpenCV) solo envían Content-Type por parte: seguir
+                # con el escaneo de marcadores para el resto del stream
+                break
+            yield jpg
+
+    # Fallback: escaneo de marcadores sobre buffer acumulador con cursor
+    buffer = bytearray()
+    cursor_busqueda = 0
+    while True:
+        chunk = resp.read(65536)
+        if not chunk:
+            return
+        buffer.extend(chunk)
+        frames, cursor_busqueda = _extraer_frames_completos(buffer, cursor_busqueda)
+        yield from frames
+
+def _extraer_frames_completos(buffer, cursor_busqueda):
+    """
+    Extrae todos los frames JPEG completos acumulados en el buffer.
+
+    Busca pares de marcadores SOI/EOI desde cursor_busqueda, consume del
+    buffer los bytes de cada frame encontrado y devuelve la posición donde
+    debe reanudarse la búsqueda en la próxima lectura.
+
+    Returns:
+        tuple: (lista de frames JPEG en bytes, nuevo cursor de búsqueda)
+    """
+    frames = []
+    while True:
+        a, b = _buscar_marcadores(buffer, cursor_busqueda)
+        if a == -1:
+            # Retener el último byte por si el marcador quedó partido
+            # entre dos lecturas
+            cursor_busqueda = max(0, len(buffer) - 1)
+            break
+        if b == -1:
+            # Frame incompleto: reanudar la búsqueda en su inicio
+            cursor_busqueda = a
+            break
+        frames.append(bytes(buffer[a:b+2]))
+        del buffer[:b+2]
+        cursor_busqueda = 0
+    return frames, cursor_busqueda
+
+def _procesar_frame(jpg_data, estado, output_filename, fourcc, fps,
+                    nombre_camara, extension, start_time,
+                    flag_decodificacion=cv2.IMREAD_COLOR):
+    """
+    Decodifica un blob JPEG y lo escribe al video, creando el escritor
+    con el primer frame decodificado.
+
+    Args:
+        estado (dict): Estado de escritura compartido con las claves
+            out, frame_size y frames_captured
+        flag_decodificacion (int): Flag de imdecode; los flags
+            IMREAD_REDUCED_COLOR_N decodifican a resolución reducida
+    """
+    # Decodificar bytes a imagen, por hardware si hay decodificador NVJPEG
+    # y no se pidió resolución reducida
+    if _decodificador_nvjpeg is not None and flag_decodificacion == cv2.IMREAD_COLOR:
+        frame = _decodificador_nvjpeg.decode(bytes(jpg_data))
+    else:
+        frame = cv2.imdecode(np.frombuffer(jpg_data, dtype=np.uint8), flag_decodificacion)
+    if frame is None:
+        return
+
+    # Configurar el escritor de video con el primer frame
+    if estado["frame_size"] is None:
+        frame_size = (frame.shape[1], frame.shape[0])
+        estado["frame_size"] = frame_size
+        estado["out"] = cv2.VideoWriter(output_filename, fourcc, fps, frame_size)
+        logger.info(f"Tamaño de frame detectado para {nombre_camara}: {frame_size}")
+        is_compressed = 'mp4' in output_filename.lower()
+        logger.info(f"Formato de video: {extension.upper()} {'(comprimido)' if is_compressed else '(sin compresión)'}")
+
+    # Escribir el frame al archivo de video
+    estado["out"].write(frame)
+    estado["frames_captured"] += 1
+
+    # Mostrar avance cada ~5 segundos; el formato con argumentos % solo se
+    # evalúa si el nivel INFO está habilitado
+    if estado["frames_captured"] % (fps * 5) == 0:
+        logger.info("%s: Capturado %d frames (%.2f segundos)",
+                    nombre_camara, estado["frames_captured"],
+                    time.time() - start_time)
+
+def _decodificador_escritor(cola, output_filename, fourcc, fps, nombre_camara,
+                            extension, start_time, estado,
+                            flag_decodificacion=cv2.IMREAD_COLOR):
+    """
+    Hilo consumidor: decodifica frames JPEG de la cola y los escribe al video.
+
+    Recibe blobs JPEG por la cola y termina al recibir el centinela None.
+    Tanto imdecode como write liberan el GIL, así que corre en paralelo real
+    con el hilo lector. El VideoWriter se crea con el primer frame decodificado.
+
+    Args:
+        cola (Queue): Cola de blobs JPEG producida por el hilo lector
+        estado (dict): Diccionario compartido donde se reportan
+            frames_captured y frame_size al terminar
+    """
+    try:
+        fin = False
+        while not fin:
+            # Drenar hasta 8 frames pendientes por ciclo: procesarlos en un
+            # bucle apretado coaliza la sobrecarga de cola y de GIL por frame
+            lote = [cola.get()]
+            while len(lote) < 8:
+                try:
+                    lote.append(cola.get_nowait())
+                except Empty:
+                    break
+
+            for jpg_data in lote:
+                if jpg_data is None:
+                    fin = True
+                    break
+                _procesar_frame(jpg_data, estado, output_filename, fourcc, fps,
+                                nombre_camara, extension, start_time,
+                                flag_decodificacion)
+    except Exception as e:
+        # Si un frame revienta el decode/write, el hilo termina limpio; el
+        # productor detecta la cola llena y puede encolar igual el centinela
+        logger.error(f"Error en el consumidor de {nombre_camara}: {str(e)}")
+    finally:
+        if estado["out"] is not None:
+            estado["out"].release()
+
+def _escritor_copia_directa(cola, output_filename, fps, nombre_camara, estado):
+    """
+    Hilo consumidor del modo copia directa: muxea los JPEG del stream al
+    contenedor de salida con ffmpeg (-c:v copy), sin decodificar ni
+    recodificar ningún frame.
+
+    Args:
+        cola (Queue): Cola de blobs JPEG producida por el hilo lector
+        estado (dict): Diccionario compartido donde se reporta frames_captured
+    """
+    proceso = None
+    try:
+        fin = False
+        while not fin:
+            # Drenar los frames pendientes y escribirlos al pipe en una sola
+            # llamada: menos syscalls de escritura por frame
+            lote = [cola.get()]
+            while len(lote) < 8:
+                try:
+                    lote.append(cola.get_nowait())
+                except Empty:
+                    break
+            if lote[-1] is None:
+                fin = True
+                lote.pop()
+            if not lote:
+                break
+
+            # Lanzar ffmpeg con el primer frame; no hace falta conocer el
+            # tamaño del frame porque no se decodifica nada
+            if proceso is None:
+                proceso = subprocess.Popen(
+                    [_FFMPEG, "-y", "-loglevel", "error",
+                     "-f", "mjpeg", "-r", str(fps), "-i", "pipe:0",
+                     "-c:v", "copy", output_filename],
+                    stdin=subprocess.PIPE, bufsize=0
+                )
+                logger.info(f"Copia directa MJPEG iniciada para {nombre_camara} -> {output_filename}")
+
+            try:
+                proceso.stdin.write(b"".join(lote))
+            except (BrokenPipeError, OSError) as e:
+                logger.error(f"ffmpeg terminó inesperadamente para {nombre_camara}: {str(e)}")
+                break
+            estado["frames_captured"] += len(lote)
+    finally:
+        if proceso is not None:
+            proceso.stdin.close()
+            proceso.wait()
+
 def capturar_video(camara, directorio, formato_nombre):
     """
     Captura video desde una URL y lo guarda en el formato configurado.
     
     Args:
-        camara (dict): Diccionario con la configuración de la cámara
+        camara (Camara): Configuración de la cámara
         directorio (str): Directorio donde guardar el video
         formato_nombre (str): Formato para el nombre del archivo
         
     Returns:
-        tuple: (éxito, nombre_archivo, mensaje)
+        tuple: (éxito, nombre_archivo, mensaje, bytes_escritos)
     """
     # Importar funciones de configuración
-    from config import obtener_extension, obtener_codec
-    
+    from config import obtener_extension, obtener_codec, obtener_copia_directa
+
     # Extraer información de la cámara
-    id_camara = camara["id"]
-    nombre_camara = camara["nombre"]
-    url = camara["url"]
-    duracion = camara.get("duracion", 30)  # Valor predeterminado: 30 segundos
-    fps = camara.get("fps", 20)  # Valor predeterminado: 20 FPS
+    id_camara = camara.id
+    nombre_camara = camara.nombre
+    url = camara.url
+    duracion = camara.duracion
+    fps = camara.fps
+    # Escala de decodificación opcional (1, 2, 4 u 8): decodificar reducido
+    # recorta el costo de CPU cuando no se necesita resolución completa
+    flag_decodificacion = _FLAGS_DECODIFICACION.get(
+        camara.decode_scale, cv2.IMREAD_COLOR
+    )
     
     # Obtener el formato y codec configurados
     extension = obtener_extension()
@@ -85,145 +493,335 @@ def capturar_video(camara, directorio, formato_nombre):
     logger.info(f"Formato: {extension.upper()}, Codec: {codec}")
     logger.info(f"Duración: {duracion} segundos, FPS: {fps}")
     
+    conn = None
     try:
-        # Iniciar sesión para el stream
-        session = requests.Session()
-        response = session.get(url, stream=True, timeout=10)
-        
-        if response.status_code != 200:
-            mensaje = f"Error al conectar a la URL de {nombre_camara}: Código {response.status_code}"
+        # Conexión HTTP directa al stream, sin capas intermedias por chunk
+        conn, response = _abrir_stream(url)
+
+        if response.status != 200:
+            mensaje = f"Error al conectar a la URL de {nombre_camara}: Código {response.status}"
             logger.error(mensaje)
-            return False, output_filename, mensaje
-        
+            return False, output_filename, mensaje, 0
+
+        # Boundary multipart: permite leer cada frame por Content-Length
+        # en lugar de escanear marcadores JPEG
+        boundary = _extraer_boundary(response.getheader("Content-Type", ""))
+
         # Configurar el codec según el formato seleccionado
-        fourcc = cv2.VideoWriter_fourcc(*codec)
-        
-        # Variables para controlar el tamaño y la escritura
-        frame_size = None
-        out = None
-        bytes_data = bytes()
-        
+        fourcc = _obtener_fourcc(extension, codec)
+
         start_time = time.time()
-        frames_captured = 0
-        
-        # Bucle de captura
-        while time.time() - start_time < duracion:
-            # Leer datos del stream
-            chunk = response.raw.read(1024)
-            if not chunk:
-                break
-                
-            bytes_data += chunk
-            
-            # Buscar inicio de un frame JPEG en el stream
-            a = bytes_data.find(b'\xff\xd8')
-            b = bytes_data.find(b'\xff\xd9')
-            
-            # Si tenemos un frame completo
-            if a != -1 and b != -1:
-                jpg_data = bytes_data[a:b+2]
-                bytes_data = bytes_data[b+2:]
-                
-                # Decodificar bytes a imagen
-                frame = cv2.imdecode(np.frombuffer(jpg_data, dtype=np.uint8), cv2.IMREAD_COLOR)
-                
-                if frame is not None:
-                    # Configurar el escritor de video con el primer frame
-                    if frame_size is None:
-                        frame_size = (frame.shape[1], frame.shape[0])
-                        out = cv2.VideoWriter(output_filename, fourcc, fps, frame_size)
-                        logger.info(f"Tamaño de frame detectado para {nombre_camara}: {frame_size}")
-                        is_compressed = 'mp4' in output_filename.lower()
-                        logger.info(f"Formato de video: {extension.upper()} {'(comprimido)' if is_compressed else '(sin compresión)'}")
-                    
-                    # Escribir el frame al archivo de video
-                    out.write(frame)
-                    frames_captured += 1
-                    
-                    # Mostrar avance periódicamente
-                    if frames_captured % fps == 0:
-                        elapsed = time.time() - start_time
-                        logger.info(f"{nombre_camara}: Capturado {frames_captured} frames ({elapsed:.2f} segundos)")
-        
-        # Liberar recursos
-        if out is not None:
-            out.release()
+
+        # Pipeline productor/consumidor: este hilo lee del socket y encola
+        # blobs JPEG; el hilo consumidor decodifica y escribe al disco.
+        # La cola acotada mantiene la latencia limitada si el consumidor
+        # se atrasa.
+        cola = Queue(maxsize=8)
+        estado = {"out": None, "frame_size": None, "frames_captured": 0}
+
+        # Copia directa: si hay ffmpeg y no se pidió resolución reducida,
+        # los JPEG se muxean tal cual al contenedor sin decodificar ni
+        # recodificar — el costo por frame se reduce a copiar bytes
+        copia_directa = (
+            _FFMPEG is not None
+            and obtener_copia_directa()
+            and flag_decodificacion == cv2.IMREAD_COLOR
+        )
+        if copia_directa:
+            consumidor = Thread(
+                target=_escritor_copia_directa,
+                args=(cola, output_filename, fps, nombre_camara, estado)
+            )
+        else:
+            consumidor = Thread(
+                target=_decodificador_escritor,
+                args=(cola, output_filename, fourcc, fps, nombre_camara,
+                      extension, start_time, estado, flag_decodificacion)
+            )
+        consumidor.start()
+
+        try:
+            # Bucle de lectura
+            for jpg_data in _frames_mjpeg(response, boundary):
+                if time.time() - start_time >= duracion:
+                    break
+                try:
+                    cola.put_nowait(jpg_data)
+                except Full:
+                    # Cola llena: descartar el frame más viejo para no
+                    # acumular latencia y encolar el más reciente
+                    try:
+                        cola.get_nowait()
+                    except Empty:
+                        pass
+                    cola.put_nowait(jpg_data)
+        finally:
+            # Centinela de fin de stream, encolado con la misma lógica de
+            # descarte que los frames: si el consumidor murió (p. ej. ffmpeg
+            # cerró el pipe) la cola queda llena y un put bloqueante no
+            # retornaría nunca
+            while True:
+                try:
+                    cola.put_nowait(None)
+                    break
+                except Full:
+                    try:
+                        cola.get_nowait()
+                    except Empty:
+                        pass
+            consumidor.join()
+
+        frames_captured = estado["frames_captured"]
+
+        # Reportar resultado
+        if frames_captured > 0:
+            # Un solo stat del archivo terminado: el llamador ya no necesita
+            # volver a consultarlo para conocer el tamaño
+            try:
+                bytes_escritos = os.stat(output_filename).st_size
+            except OSError:
+                bytes_escritos = 0
             logger.info(f"Video de {nombre_camara} guardado como {output_filename}")
             logger.info(f"Total de frames capturados: {frames_captured}")
-            return True, output_filename, f"Captura completada: {frames_captured} frames"
+            return (True, output_filename,
+                    f"Captura completada: {frames_captured} frames",
+                    bytes_escritos)
         else:
             mensaje = f"No se pudo iniciar la captura de video para {nombre_camara}. Verifique la URL."
             logger.error(mensaje)
-            return False, output_filename, mensaje
-            
-    except requests.exceptions.RequestException as e:
+            return False, output_filename, mensaje, 0
+
+    except (http.client.HTTPException, OSError) as e:
         mensaje = f"Error de conexión para {nombre_camara}: {str(e)}"
         logger.error(mensaje)
-        return False, output_filename, mensaje
+        return False, output_filename, mensaje, 0
     except Exception as e:
         mensaje = f"Error durante la captura de {nombre_camara}: {str(e)}"
         logger.error(mensaje)
-        return False, output_filename, mensaje
+        return False, output_filename, mensaje, 0
+    finally:
+        if conn is not None:
+            conn.close()
 
-def worker_captura(queue, directorio, formato_nombre, resultados):
-    """Función worker para procesar cámaras en hilos paralelos."""
-    while not queue.empty():
-        try:
-            camara = queue.get()
-            exito, archivo, mensaje = capturar_video(camara, directorio, formato_nombre)
-            resultados.append({
-                "id": camara["id"],
-                "nombre": camara["nombre"],
+def iter_capturas(camaras, directorio, formato_nombre, max_hilos=4):
+    """
+    Captura video de múltiples cámaras en paralelo, generando cada resultado
+    en cuanto su cámara termina.
+
+    A diferencia de capturar_todas_las_camaras, el llamador puede reportar
+    o persistir cada resultado sin esperar a la cámara más lenta.
+
+    Args:
+        camaras (list): Lista de objetos Camara a capturar
+        directorio (str): Directorio donde guardar los videos
+        formato_nombre (str): Formato para nombres de archivos
+        max_hilos (int): Número máximo de hilos en paralelo
+
+    Yields:
+        dict: Resultado de captura por cámara
+    """
+    if not camaras:
+        logger.warning("No hay cámaras habilitadas para capturar")
+        return
+
+    # Crear directorio si no existe
+    configurar_directorios(directorio)
+
+    # Descartar de antemano las cámaras inaccesibles para que no ocupen
+    # hilos del pool esperando el timeout de conexión
+    vivas, muertas = _preverificar_camaras(camaras)
+    for camara in muertas:
+        mensaje = f"Cámara inaccesible: no responde en {camara.url}"
+        logger.error(mensaje)
+        yield {
+            "id": camara.id,
+            "nombre": camara.nombre,
+            "exito": False,
+            "archivo": "",
+            "mensaje": mensaje,
+            "bytes": 0
+        }
+
+    if not vivas:
+        return
+
+    # Limitar hilos al número de cámaras si es necesario
+    num_hilos = min(max_hilos, len(vivas))
+
+    # Lanzar las capturas en un pool de hilos y entregar resultados a medida
+    # que cada cámara termina
+    logger.info(f"Iniciando captura con {num_hilos} hilos paralelos")
+    with ThreadPoolExecutor(max_workers=num_hilos) as executor:
+        futuros = {
+            executor.submit(capturar_video, camara, directorio, formato_nombre): camara
+            for camara in vivas
+        }
+        for futuro in as_completed(futuros):
+            camara = futuros[futuro]
+            try:
+                exito, archivo, mensaje, bytes_escritos = futuro.result()
+            except Exception as e:
+                logger.error(f"Error en captura de {camara.nombre}: {str(e)}")
+                exito, archivo, mensaje, bytes_escritos = False, "", str(e), 0
+            yield {
+                "id": camara.id,
+                "nombre": camara.nombre,
                 "exito": exito,
                 "archivo": archivo,
-                "mensaje": mensaje
-            })
-        except Exception as e:
-            logger.error(f"Error en worker de captura: {str(e)}")
-        finally:
-            queue.task_done()
+                "mensaje": mensaje,
+                "bytes": bytes_escritos
+            }
 
 def capturar_todas_las_camaras(camaras, directorio, formato_nombre, max_hilos=4):
     """
     Captura video de múltiples cámaras en paralelo.
-    
+
     Args:
-        camaras (list): Lista de diccionarios con configuración de cámaras
+        camaras (list): Lista de objetos Camara a capturar
         directorio (str): Directorio donde guardar los videos
         formato_nombre (str): Formato para nombres de archivos
         max_hilos (int): Número máximo de hilos en paralelo
-        
+
     Returns:
         list: Lista de resultados por cámara
     """
+    return list(iter_capturas(camaras, directorio, formato_nombre, max_hilos))
+
+async def _capturar_camara_async(session, camara, directorio, formato_nombre, cv_pool):
+    """
+    Captura una cámara leyendo su stream con aiohttp sobre el event loop.
+
+    La lectura del socket es asíncrona; la decodificación y escritura
+    (CPU/disco) se delegan al pool de hilos cv_pool para no bloquear el loop.
+
+    Returns:
+        dict: Resultado de la captura con las mismas claves que produce
+        capturar_todas_las_camaras
+    """
+    import aiohttp
+
+    from config import obtener_extension, obtener_codec
+
+    id_camara = camara.id
+    nombre_camara = camara.nombre
+    url = camara.url
+    duracion = camara.duracion
+    fps = camara.fps
+    flag_decodificacion = _FLAGS_DECODIFICACION.get(
+        camara.decode_scale, cv2.IMREAD_COLOR
+    )
+
+    extension = obtener_extension()
+    codec = obtener_codec()
+    fourcc = _obtener_fourcc(extension, codec)
+
+    output_filename = generar_nombre_archivo(formato_nombre, id_camara, directorio, extension)
+
+    logger.info(f"Iniciando captura asíncrona desde {nombre_camara} (ID: {id_camara})")
+
+    loop = asyncio.get_running_loop()
+    estado = {"out": None, "frame_size": None, "frames_captured": 0}
+
+    try:
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=_TIMEOUT_CONEXION, sock_read=_TIMEOUT_LECTURA
+        )
+        async with session.get(url, timeout=timeout) as response:
+            if response.status != 200:
+                mensaje = f"Error al conectar a la URL de {nombre_camara}: Código {response.status}"
+                logger.error(mensaje)
+                return {
+                    "id": id_camara, "nombre": nombre_camara, "exito": False,
+                    "archivo": output_filename, "mensaje": mensaje, "bytes": 0
+                }
+
+            buffer = bytearray()
+            cursor_busqueda = 0
+            start_time = time.time()
+
+            async for chunk in response.content.iter_chunked(65536):
+                if time.time() - start_time >= duracion:
+                    break
+                buffer.extend(chunk)
+                frames, cursor_busqueda = _extraer_frames_completos(buffer, cursor_busqueda)
+                for jpg_data in frames:
+                    # El decode+write se ejecuta fuera del event loop; las
+                    # llamadas se esperan en orden, así que los frames de una
+                    # misma cámara nunca se escriben desordenados
+                    await loop.run_in_executor(
+                        cv_pool, _procesar_frame, jpg_data, estado,
+                        output_filename, fourcc, fps, nombre_camara,
+                        extension, start_time, flag_decodificacion
+                    )
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        mensaje = f"Error durante la captura de {nombre_camara}: {str(e)}"
+        logger.error(mensaje)
+        return {
+            "id": id_camara, "nombre": nombre_camara, "exito": False,
+            "archivo": output_filename, "mensaje": mensaje, "bytes": 0
+        }
+    finally:
+        if estado["out"] is not None:
+            estado["out"].release()
+
+    frames_captured = estado["frames_captured"]
+    if estado["frame_size"] is not None:
+        try:
+            bytes_escritos = os.stat(output_filename).st_size
+        except OSError:
+            bytes_escritos = 0
+        logger.info(f"Video de {nombre_camara} guardado como {output_filename}")
+        return {
+            "id": id_camara, "nombre": nombre_camara, "exito": True,
+            "archivo": output_filename,
+            "mensaje": f"Captura completada: {frames_captured} frames",
+            "bytes": bytes_escritos
+        }
+    mensaje = f"No se pudo iniciar la captura de video para {nombre_camara}. Verifique la URL."
+    logger.error(mensaje)
+    return {
+        "id": id_camara, "nombre": nombre_camara, "exito": False,
+        "archivo": output_filename, "mensaje": mensaje, "bytes": 0
+    }
+
+async def capturar_todas_las_camaras_async(camaras, directorio, formato_nombre,
+                                           max_decodificadores=None):
+    """
+    Captura video de múltiples cámaras compartiendo un solo event loop.
+
+    Alternativa a capturar_todas_las_camaras para muchos streams: todas las
+    lecturas de red comparten un hilo (asyncio + aiohttp) en lugar de un hilo
+    por cámara, y solo la decodificación/escritura usa un pool de hilos
+    acotado por CPU. Requiere aiohttp instalado.
+
+    Args:
+        camaras (list): Lista de objetos Camara a capturar
+        directorio (str): Directorio donde guardar los videos
+        formato_nombre (str): Formato para nombres de archivos
+        max_decodificadores (int, optional): Hilos para decode/escritura;
+            por defecto, el número de CPUs
+
+    Returns:
+        list: Lista de resultados por cámara
+    """
+    import aiohttp
+
     if not camaras:
         logger.warning("No hay cámaras habilitadas para capturar")
         return []
-    
-    # Crear directorio si no existe
+
     configurar_directorios(directorio)
-    
-    # Cola de trabajo y resultados
-    queue = Queue()
-    resultados = []
-    
-    # Agregar cámaras a la cola
-    for camara in camaras:
-        queue.put(camara)
-    
-    # Limitar hilos al número de cámaras si es necesario
-    num_hilos = min(max_hilos, len(camaras))
-    
-    # Crear y lanzar hilos
-    logger.info(f"Iniciando captura con {num_hilos} hilos paralelos")
-    hilos = []
-    for _ in range(num_hilos):
-        t = Thread(target=worker_captura, args=(queue, directorio, formato_nombre, resultados))
-        t.daemon = True
-        t.start()
-        hilos.append(t)
-    
-    # Esperar a que terminen todos los hilos
-    queue.join()
-    
-    return resultados
\ No newline at end of file
+
+    cv_pool = ThreadPoolExecutor(max_workers=max_decodificadores or os.cpu_count())
+    try:
+        logger.info(f"Iniciando captura asíncrona de {len(camaras)} cámaras")
+        async with aiohttp.ClientSession() as session:
+            resultados = await asyncio.gather(*[
+                _capturar_camara_async(session, camara, directorio, formato_nombre, cv_pool)
+                for camara in camaras
+            ])
+        return list(resultados)
+    finally:
+        cv_pool.shutdown(wait=True)
\ No newline at end of file
@@ -4,7 +4,10 @@ Archivo de configuración para las cámaras de vigilancia.
 Cada cámara debe tener un identificador único y una URL de stream.
 """
 
+import functools
 import os
+import threading
+from dataclasses import dataclass, asdict
 
 # Duración predeterminada de captura para todas las cámaras (en segundos)
 DURACION_PREDETERMINADA = 30
@@ -39,60 +42,101 @@ CODECS = {
     "avi": "I420"   # Codec para AVI (sin compresión)
 }
 
+# Copia directa MJPEG: si ffmpeg está disponible, los frames JPEG del stream
+# se muxean tal cual al contenedor, sin decodificar ni recodificar (mucho
+# más barato y sin pérdida adicional). Poner en False para forzar la
+# transcodificación con OpenCV según CODECS.
+COPIA_DIRECTA_MJPEG = True
+
+# Función para consultar si está habilitada la copia directa MJPEG
+def obtener_copia_directa():
+    """Retorna True si la copia directa MJPEG está habilitada."""
+    return COPIA_DIRECTA_MJPEG
+
 # Formato de nombres de archivos (se agregará fecha/hora automáticamente)
 # La extensión se ajustará automáticamente según FORMATO_VIDEO
 FORMATO_NOMBRE = "camara_{id}_{timestamp}.{ext}"
 
-# Lista de cámaras configuradas
-# Cada cámara es un diccionario con:
-# - id: identificador único para la cámara (string)
-# - nombre: nombre descriptivo de la cámara (string)
-# - url: URL del stream de video (string)
-# - duracion: duración en segundos para esta cámara específica (opcional, int)
-# - fps: frames por segundo para esta cámara específica (opcional, int)
-# - habilitada: indica si esta cámara debe ser incluida en la captura (bool)
+# Definición de una cámara: objeto con slots en lugar de diccionario, así
+# el acceso por atributo no paga un hash lookup por campo y cada registro
+# ocupa menos memoria
+@dataclass(slots=True)
+class Camara:
+    """
+    Configuración de una cámara de vigilancia.
+
+    Attributes:
+        id: identificador único para la cámara
+        nombre: nombre descriptivo de la cámara
+        url: URL del stream de video
+        duracion: duración en segundos para esta cámara específica
+        fps: frames por segundo para esta cámara específica
+        decode_scale: escala de decodificación 1/2/4/8; valores mayores a 1
+            decodifican a resolución reducida con menos CPU
+        habilitada: indica si esta cámara debe ser incluida en la captura
+    """
+    id: str
+    nombre: str
+    url: str
+    duracion: int = DURACION_PREDETERMINADA
+    fps: int = FPS_PREDETERMINADOS
+    decode_scale: int = 1
+    habilitada: bool = True
+
+    def a_dict(self):
+        """Retorna la cámara como diccionario (para respuestas JSON)."""
+        return asdict(self)
 
+# Lista de cámaras configuradas
 CAMARAS = [
-    {
-        "id": "cam1",
-        "nombre": "Cámara Principal",
-        "url": "http://10.137.140.97:8000/video_feed",
-        "duracion": 30,
-        "fps": 30,
-        "habilitada": True
-    }
+    Camara(
+        id="cam1",
+        nombre="Cámara Principal",
+        url="http://10.137.140.97:8000/video_feed",
+        duracion=30,
+        fps=30,
+        habilitada=True
+    )
 ]
 
+# Índice por ID para búsquedas O(1); los valores son las mismas instancias
+# Camara de CAMARAS, así que mutar una cámara obtenida por el índice
+# actualiza ambos
+_CAMARAS_POR_ID = {camara.id: camara for camara in CAMARAS}
+
+# Lock para mutaciones de cámaras: la API y los hilos de captura comparten
+# esta configuración
+BLOQUEO_CAMARAS = threading.Lock()
+
 # Función para obtener solo las cámaras habilitadas
 def obtener_camaras_habilitadas():
     """Retorna una lista con solo las cámaras que están habilitadas."""
-    return [camara for camara in CAMARAS if camara.get("habilitada", True)]
+    return [camara for camara in CAMARAS if camara.habilitada]
 
 # Función para obtener una cámara por su ID
 def obtener_camara_por_id(id_camara):
     """Busca y retorna una cámara por su ID."""
-    for camara in CAMARAS:
-        if camara["id"] == id_camara:
-            return camara
-    return None
+    return _CAMARAS_POR_ID.get(id_camara)
 
 # Función para habilitar/deshabilitar una cámara
 def cambiar_estado_camara(id_camara, habilitar=True):
     """Cambia el estado de habilitación de una cámara."""
-    for i, camara in enumerate(CAMARAS):
-        if camara["id"] == id_camara:
-            CAMARAS[i]["habilitada"] = habilitar
-            return True
-    return False
+    camara = _CAMARAS_POR_ID.get(id_camara)
+    if camara is None:
+        return False
+    with BLOQUEO_CAMARAS:
+        camara.habilitada = habilitar
+    return True
 
 # Función para actualizar la URL de una cámara
 def actualizar_url_camara(id_camara, nueva_url):
     """Actualiza la URL de una cámara específica."""
-    for i, camara in enumerate(CAMARAS):
-        if camara["id"] == id_camara:
-            CAMARAS[i]["url"] = nueva_url
-            return True
-    return False
+    camara = _CAMARAS_POR_ID.get(id_camara)
+    if camara is None:
+        return False
+    with BLOQUEO_CAMARAS:
+        camara.url = nueva_url
+    return True
 
 # Función para cambiar el formato de video
 def cambiar_formato_video(formato):
@@ -113,16 +157,25 @@ def cambiar_formato_video(formato):
     
     global FORMATO_VIDEO
     FORMATO_VIDEO = formato.lower()
+    # El formato cambió: invalidar los resultados memorizados
+    obtener_extension.cache_clear()
+    obtener_codec.cache_clear()
     print(f"Formato de video cambiado a: {FORMATO_VIDEO}")
     print(f"Codec utilizado: {CODECS[FORMATO_VIDEO]}")
     return True
 
+# Extensión y codec se consultan en varios puntos por captura; como solo
+# cambian vía cambiar_formato_video (que limpia la caché), se memorizan
+# para que las llamadas repetidas sean casi gratis
+
 # Función para obtener la extensión de archivo según el formato de video actual
+@functools.lru_cache(maxsize=1)
 def obtener_extension():
     """Retorna la extensión de archivo según el formato de video configurado."""
     return FORMATO_VIDEO
 
 # Función para obtener el codec según el formato de video actual
+@functools.lru_cache(maxsize=1)
 def obtener_codec():
     """Retorna el código de codec según el formato de video configurado."""
     return CODECS[FORMATO_VIDEO]
\ No newline at end of file
@@ -3,11 +3,11 @@
 Script principal para ejecutar la captura de video de múltiples cámaras.
 """
 
-import argparse
+import sys
 import time
 from datetime import datetime
+from types import SimpleNamespace
 import os
-import json
 
 # Importar módulos propios
 from config import (
@@ -22,56 +22,226 @@ from config import (
     obtener_extension,
     obtener_codec
 )
-from capturador import capturar_video, capturar_todas_las_camaras
+
+# capturador se importa recién en las ramas que capturan: arrastra cv2 y
+# numpy (cientos de ms) que --listar/--enable/--disable nunca necesitan
+
+# Codificador JSON para reportes: orjson (C) cuando está instalado,
+# stdlib en caso contrario
+try:
+    import orjson
+
+    def _dumps_reporte(reporte):
+        """Serializa el reporte a bytes JSON indentado."""
+        return orjson.dumps(reporte, option=orjson.OPT_INDENT_2)
+
+    def _dumps_linea(obj):
+        """Serializa un objeto a una línea JSON compacta en bytes."""
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    def _dumps_reporte(reporte):
+        """Serializa el reporte a bytes JSON indentado."""
+        return json.dumps(reporte, indent=2, ensure_ascii=False).encode('utf-8')
+
+    def _dumps_linea(obj):
+        """Serializa un objeto a una línea JSON compacta en bytes."""
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+# Plantillas de fila precompiladas: ligar .format una vez evita que el
+# intérprete re-parsee la especificación de formato en cada fila
+_FILA_CAMARA = "{:<10} {:<25} {:<10} {}".format
+
+# Formateador de fila de resultados generado en tiempo de import: el
+# esquema de la fila es fijo, así que un f-string compilado via exec
+# especializado a esas claves reemplaza a la plantilla .format genérica
+# que se reinterpreta en cada fila
+_ns = {}
+exec(
+    "def _fmt_resultado(r, tam, base):\n"
+    "    return (f'{r[\"id\"]:<10} {r[\"nombre\"]:<25} '\n"
+    "            f'{\"Éxito\" if r[\"exito\"] else \"Error\":<10} '\n"
+    "            f'{base:<30} {tam:.2f}')\n",
+    _ns,
+)
+_fmt_resultado = _ns["_fmt_resultado"]
+del _ns
+
+# Búfer de salida reutilizable: las filas se acumulan en un único bytearray
+# que se limpia en cada emisión, evitando la cadena intermedia de
+# "\n".join y la presión de asignaciones cuando hay muchas filas
+_BUF_SALIDA = bytearray()
+
+def _emitir_filas(filas, _buf=_BUF_SALIDA):
+    """Escribe las filas en stdout acumulándolas en el búfer reutilizable."""
+    del _buf[:]
+    extender = _buf.extend
+    for fila in filas:
+        extender(fila.encode())
+        extender(b"\n")
+    salida = sys.stdout.buffer
+    salida.write(_buf)
+    salida.flush()
+
+def _formatear_fila_resultado(resultado, _fmt=_fmt_resultado,
+                              _basename=os.path.basename):
+    """
+    Formatea la fila de la tabla para un resultado de captura.
+
+    Es el núcleo caliente del reporte: los colaboradores están ligados como
+    argumentos por defecto para que el cuerpo solo toque locales.
+
+    Returns:
+        tuple: (fila formateada, éxito, tamaño del archivo en MB)
+    """
+    # El capturador ya reporta los bytes escritos: cero syscalls por fila
+    tamano = resultado["bytes"] / (1024 * 1024)  # MB
+
+    return (_fmt(resultado, tamano, _basename(resultado["archivo"])),
+            resultado["exito"], tamano)
 
 def mostrar_camaras():
     """Muestra la lista de cámaras configuradas."""
-    print("\n=== CÁMARAS CONFIGURADAS ===")
-    print(f"{'ID':<10} {'NOMBRE':<25} {'HABILITADA':<10} {'URL'}")
-    print("-" * 80)
-    
+    filas = [
+        "\n=== CÁMARAS CONFIGURADAS ===",
+        _FILA_CAMARA("ID", "NOMBRE", "HABILITADA", "URL"),
+        "-" * 80,
+    ]
+
+    # Contar las habilitadas en el mismo recorrido que arma la tabla
+    habilitadas = 0
     for camara in CAMARAS:
-        habilitada = "Sí" if camara.get("habilitada", True) else "No"
-        print(f"{camara['id']:<10} {camara['nombre']:<25} {habilitada:<10} {camara['url']}")
-    
-    print("-" * 80)
-    print(f"Total: {len(CAMARAS)} cámaras, {len(obtener_camaras_habilitadas())} habilitadas\n")
-
-def guardar_resultados(resultados):
-    """Guarda los resultados de la captura en un archivo JSON."""
-    # Crear directorio de reportes si no existe
-    directorio_reportes = "reportes"
-    if not os.path.exists(directorio_reportes):
-        os.makedirs(directorio_reportes)
-    
-    # Generar nombre de archivo con timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    archivo_reporte = os.path.join(directorio_reportes, f"captura_{timestamp}.json")
-    
-    # Obtener información del formato actual
-    formato = obtener_extension().upper()
-    codec = obtener_codec()
-    
+        esta_habilitada = camara.habilitada
+        habilitadas += esta_habilitada
+        filas.append(_FILA_CAMARA(camara.id, camara.nombre,
+                                  'Sí' if esta_habilitada else 'No', camara.url))
+
+    filas.append("-" * 80)
+    filas.append(f"Total: {len(CAMARAS)} cámaras, {habilitadas} habilitadas\n")
+
+    # Emitir toda la sección con una sola escritura en lugar de un print
+    # (lock + flush) por fila
+    _emitir_filas(filas)
+
+# El directorio de reportes se crea una sola vez por proceso: los
+# llamadores que guardan reportes en bucle (daemon, cron) no pagan un
+# syscall por invocación
+_directorio_reportes_creado = False
+
+def _asegurar_directorio_reportes():
+    """Crea el directorio de reportes la primera vez que hace falta."""
+    global _directorio_reportes_creado
+    if not _directorio_reportes_creado:
+        os.makedirs("reportes", exist_ok=True)
+        _directorio_reportes_creado = True
+
+def _iter_reportes(dirpath="reportes"):
+    """
+    Genera (nombre, tamaño en bytes) por cada reporte en el directorio.
+
+    Usa os.scandir: el DirEntry trae el stat cacheado del propio listado,
+    así que no se paga un stat() adicional por archivo como con
+    os.listdir + os.path.getsize.
+
+    Yields:
+        tuple: (nombre de archivo, tamaño en bytes)
+    """
+    try:
+        with os.scandir(dirpath) as entradas:
+            for entrada in entradas:
+                if entrada.is_file():
+                    yield entrada.name, entrada.stat().st_size
+    except FileNotFoundError:
+        return
+
+def mostrar_reportes():
+    """Muestra los reportes de captura guardados."""
+    filas = [
+        "\n=== REPORTES DE CAPTURA ===",
+        f"{'ARCHIVO':<40} {'TAMAÑO (KB)'}",
+        "-" * 55,
+    ]
+
+    total = 0
+    for nombre, tamano in sorted(_iter_reportes()):
+        total += 1
+        filas.append(f"{nombre:<40} {tamano / 1024:.1f}")
+
+    filas.append("-" * 55)
+    filas.append(f"Total: {total} reportes\n")
+    _emitir_filas(filas)
+
+def guardar_resultados(resultados, exitosas=None, formato=None, codec=None,
+                       archivo_detalle=None, archivo=None):
+    """
+    Guarda los resultados de la captura en un archivo JSON.
+
+    Args:
+        resultados (list): Lista de resultados por cámara
+        exitosas (int, optional): Cantidad de capturas exitosas si el
+            llamador ya la contó; si es None se cuenta aquí
+        formato (str, optional): Formato de video ya resuelto (en mayúsculas)
+        codec (str, optional): Codec ya resuelto
+        archivo_detalle (str, optional): Ruta del JSONL donde el llamador ya
+            persistió los resultados en streaming; si se pasa, el reporte
+            guarda solo el resumen y la referencia al detalle
+        archivo (file, optional): Manejador binario ya abierto donde escribir
+            el reporte; permite a un llamador de larga vida reutilizar un
+            escritor en lugar de abrir y cerrar un archivo por reporte
+    """
+    # Una sola lectura del reloj para el timestamp del nombre y la fecha
+    # del reporte; dos llamadas podrían caer en segundos distintos
+    ahora = datetime.now()
+
+    if archivo is None:
+        _asegurar_directorio_reportes()
+        timestamp = ahora.strftime("%Y%m%d_%H%M%S")
+        archivo_reporte = os.path.join("reportes", f"captura_{timestamp}.json")
+    else:
+        archivo_reporte = getattr(archivo, "name", "<archivo abierto>")
+
+    # Obtener información del formato actual si el llamador no la pasó
+    if formato is None:
+        formato = obtener_extension().upper()
+    if codec is None:
+        codec = obtener_codec()
+
+    # Contar éxitos una sola vez; las fallas se derivan del total
+    total_camaras = len(resultados)
+    if exitosas is None:
+        exitosas = sum(r["exito"] for r in resultados)
+
     # Crear un diccionario con información del reporte
     reporte = {
-        "fecha": datetime.now().isoformat(),
-        "total_camaras": len(resultados),
-        "exitosas": sum(1 for r in resultados if r["exito"]),
-        "fallidas": sum(1 for r in resultados if not r["exito"]),
+        "fecha": ahora.isoformat(),
+        "total_camaras": total_camaras,
+        "exitosas": exitosas,
+        "fallidas": total_camaras - exitosas,
         "formato_video": f"{formato} ({codec})",
-        "resultados": resultados
     }
-    
-    # Guardar como JSON
-    with open(archivo_reporte, 'w', encoding='utf-8') as f:
-        json.dump(reporte, f, indent=2, ensure_ascii=False)
-    
+    if archivo_detalle is not None:
+        # El detalle ya quedó línea por línea en el JSONL; no se duplica
+        reporte["archivo_resultados"] = archivo_detalle
+    else:
+        reporte["resultados"] = resultados
+
+    # Guardar como JSON: serializar a bytes de una vez y escribir con una
+    # sola llamada evita las muchas escrituras pequeñas de json.dump
+    if archivo is None:
+        with open(archivo_reporte, 'wb') as f:
+            f.write(_dumps_reporte(reporte))
+    else:
+        archivo.write(_dumps_reporte(reporte))
+        archivo.write(b"\n")
+
     print(f"Reporte guardado en: {archivo_reporte}")
     return archivo_reporte
 
-def main():
-    """Función principal del programa."""
-    # Configurar argumentos de línea de comandos
+def _build_parser():
+    """Construye el parser de argumentos; argparse se importa recién aquí."""
+    import argparse
+
     parser = argparse.ArgumentParser(description="Capturador de video desde múltiples cámaras")
     parser.add_argument('-l', '--listar', action='store_true', help='Listar cámaras configuradas')
     parser.add_argument('-c', '--capturar', action='store_true', help='Iniciar captura de todas las cámaras habilitadas')
@@ -79,11 +249,48 @@ def main():
     parser.add_argument('-e', '--enable', metavar='ID_CAMARA', help='Habilitar una cámara por su ID')
     parser.add_argument('-d', '--disable', metavar='ID_CAMARA', help='Deshabilitar una cámara por su ID')
     parser.add_argument('-p', '--paralelo', type=int, default=4, help='Número máximo de hilos paralelos (por defecto: 4)')
-    parser.add_argument('-f', '--formato', metavar='FORMATO', choices=['mp4', 'avi'], 
+    parser.add_argument('-f', '--formato', metavar='FORMATO', choices=['mp4', 'avi'],
                         help='Establecer formato de video (mp4: comprimido, avi: sin compresión)')
-    
-    args = parser.parse_args()
-    
+    parser.add_argument('-r', '--reportes', action='store_true',
+                        help='Listar reportes de captura guardados')
+    return parser
+
+def _parse_args(argv):
+    """
+    Analiza los argumentos de línea de comandos.
+
+    Las invocaciones más frecuentes (sin argumentos, -l y -c con o sin
+    -p N) se resuelven inspeccionando argv directamente; importar argparse
+    y construir el parser cuesta decenas de ms que en esos casos no hacen
+    falta. Cualquier otra forma cae en el parser completo.
+    """
+    args = SimpleNamespace(listar=False, capturar=False, single=None,
+                           enable=None, disable=None, paralelo=4, formato=None,
+                           reportes=False)
+    n = len(argv)
+    if n == 0:
+        return args
+    if n == 1 and argv[0] in ('-l', '--listar'):
+        args.listar = True
+        return args
+    if n == 1 and argv[0] in ('-r', '--reportes'):
+        args.reportes = True
+        return args
+    if argv[0] in ('-c', '--capturar'):
+        if n == 1:
+            args.capturar = True
+            return args
+        if n == 3 and argv[1] in ('-p', '--paralelo') and argv[2].isdigit():
+            args.capturar = True
+            args.paralelo = int(argv[2])
+            return args
+    return _build_parser().parse_args(argv)
+
+def main():
+    """Función principal del programa."""
+    # Analizar argumentos de línea de comandos
+    args = _parse_args(sys.argv[1:])
+
     # Cambiar formato si se especificó
     if args.formato:
         cambiar_formato_video(args.formato)
@@ -100,9 +307,14 @@ def main():
     print(f"Formato de video: {formato} ({codec}) - {'Comprimido' if es_comprimido else 'Sin compresión'}")
     
     # Procesar argumentos
-    if args.listar or (not args.capturar and not args.single and not args.enable and not args.disable):
+    if args.listar or (not args.capturar and not args.single and not args.enable
+                       and not args.disable and not args.reportes):
         mostrar_camaras()
-    
+
+    # Listar reportes guardados
+    if args.reportes:
+        mostrar_reportes()
+
     # Habilitar/deshabilitar cámaras
     if args.enable:
         if cambiar_estado_camara(args.enable, True):
@@ -123,21 +335,26 @@ def main():
             print(f"Error: No se encontró la cámara con ID {args.single}")
             return
         
-        print(f"\nIniciando captura de la cámara: {camara['nombre']} (ID: {camara['id']})")
-        print(f"URL: {camara['url']}")
-        
-        inicio = time.time()
-        exito, archivo, mensaje = capturar_video(camara, DIRECTORIO_VIDEOS, FORMATO_NOMBRE)
-        duracion = time.time() - inicio
-        
-        print(f"\nResultado para {camara['nombre']}:")
+        print(f"\nIniciando captura de la cámara: {camara.nombre} (ID: {camara.id})")
+        print(f"URL: {camara.url}")
+
+        from capturador import capturar_video
+
+        # Reloj monotónico: los saltos del reloj de pared (NTP) no afectan
+        # la duración medida
+        inicio = time.perf_counter()
+        exito, archivo, mensaje, bytes_escritos = capturar_video(
+            camara, DIRECTORIO_VIDEOS, FORMATO_NOMBRE)
+        duracion = time.perf_counter() - inicio
+
+        print(f"\nResultado para {camara.nombre}:")
         print(f"  {'Éxito' if exito else 'Error'}: {mensaje}")
         print(f"  Archivo: {archivo}")
         print(f"  Tiempo total: {duracion:.2f} segundos")
-        
+
         # Mostrar advertencia sobre el tamaño del archivo
         if exito:
-            tam_archivo = os.path.getsize(archivo) / (1024 * 1024)  # Tamaño en MB
+            tam_archivo = bytes_escritos / (1024 * 1024)  # Tamaño en MB
             print(f"  Tamaño del archivo: {tam_archivo:.2f} MB")
             print("  Nota: Los archivos sin compresión pueden ser muy grandes.")
     
@@ -150,47 +367,69 @@ def main():
         
         print(f"\nIniciando captura de {len(camaras_habilitadas)} cámaras habilitadas...")
         print(f"Usando {args.paralelo} hilos en paralelo")
-        
-        inicio = time.time()
-        resultados = capturar_todas_las_camaras(
-            camaras_habilitadas, 
-            DIRECTORIO_VIDEOS, 
-            FORMATO_NOMBRE,
-            max_hilos=args.paralelo
+
+        from capturador import iter_capturas
+
+        # Encabezado de la tabla antes de empezar: las filas aparecen a
+        # medida que cada cámara termina
+        sys.stdout.write(
+            "\n=== RESULTADOS DE CAPTURA ===\n"
+            f"{'ID':<10} {'NOMBRE':<25} {'ESTADO':<10} {'ARCHIVO':<30} {'TAMAÑO (MB)'}\n"
+            + "-" * 90 + "\n"
         )
-        duracion = time.time() - inicio
-        
-        # Mostrar resultados
-        print("\n=== RESULTADOS DE CAPTURA ===")
-        print(f"{'ID':<10} {'NOMBRE':<25} {'ESTADO':<10} {'ARCHIVO':<30} {'TAMAÑO (MB)'}")
-        print("-" * 90)
-        
-        tamano_total = 0
-        for resultado in resultados:
-            estado = "Éxito" if resultado["exito"] else "Error"
-            archivo = os.path.basename(resultado["archivo"])
-            
-            # Calcular tamaño del archivo
-            tamano = 0
-            if resultado["exito"] and os.path.exists(resultado["archivo"]):
-                tamano = os.path.getsize(resultado["archivo"]) / (1024 * 1024)  # MB
+
+        inicio = time.perf_counter()
+        resultados = []
+        exitosas = 0
+        tamano_total = 0.0
+
+        # Reporte detallado en JSON Lines: cada resultado se escribe apenas
+        # llega, así una corrida interrumpida deja un reporte parcial usable
+        # y la memoria no crece con la cantidad de cámaras
+        _asegurar_directorio_reportes()
+        archivo_detalle = os.path.join(
+            "reportes", f"captura_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+
+        # Consumir los resultados en streaming: la fila de cada cámara se
+        # imprime en cuanto su captura termina, sin esperar a la más lenta
+        with open(archivo_detalle, 'wb', buffering=1 << 16) as f_detalle:
+            for resultado in iter_capturas(
+                camaras_habilitadas,
+                DIRECTORIO_VIDEOS,
+                FORMATO_NOMBRE,
+                max_hilos=args.paralelo
+            ):
+                resultados.append(resultado)
+                f_detalle.write(_dumps_linea(resultado))
+                f_detalle.write(b"\n")
+                fila, exito, tamano = _formatear_fila_resultado(resultado)
+                exitosas += exito
                 tamano_total += tamano
-            
-            print(f"{resultado['id']:<10} {resultado['nombre']:<25} {estado:<10} {archivo:<30} {tamano:.2f}")
-        
-        print("-" * 90)
-        print(f"Total: {len(resultados)} cámaras procesadas")
-        print(f"Éxito: {sum(1 for r in resultados if r['exito'])} cámaras")
-        print(f"Error: {sum(1 for r in resultados if not r['exito'])} cámaras")
-        print(f"Tamaño total: {tamano_total:.2f} MB")
-        print(f"Tiempo total: {duracion:.2f} segundos")
+                _emitir_filas((fila,))
+
+        duracion = time.perf_counter() - inicio
+
+        # Resumen final
+        filas = []
+        filas.append("-" * 90)
+        filas.append(f"Total: {len(resultados)} cámaras procesadas")
+        filas.append(f"Éxito: {exitosas} cámaras")
+        filas.append(f"Error: {len(resultados) - exitosas} cámaras")
+        filas.append(f"Tamaño total: {tamano_total:.2f} MB")
+        filas.append(f"Tiempo total: {duracion:.2f} segundos")
+
+        # El resumen sale con una sola escritura a stdout
+        _emitir_filas(filas)
         
         # Advertencia sobre el espacio en disco
         print("\nADVERTENCIA: Los archivos de video sin compresión ocupan mucho espacio en disco.")
         print("             Asegúrese de tener suficiente espacio disponible para grabaciones prolongadas.")
         
-        # Guardar reporte
-        guardar_resultados(resultados)
+        # Guardar el resumen reutilizando el conteo y el formato ya resueltos;
+        # el detalle por cámara ya quedó en el JSONL
+        print(f"Detalle por cámara en: {archivo_detalle}")
+        guardar_resultados(resultados, exitosas=exitosas, formato=formato,
+                           codec=codec, archivo_detalle=archivo_detalle)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file